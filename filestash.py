@@ -1,19 +1,45 @@
 #!/usr/bin/env python3
 import argparse
+import errno
+import functools
 import hashlib
 import json
+import mmap
+import os
 import re
 import shutil
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple
 
 
-DATE_PATTERN = re.compile(r"^(?P<date>\d{4}\.\d{2}\.\d{2})\s*-\s*(?P<rest>.+)$")
-SAFE_CHARS_PATTERN = re.compile(r'[<>:"/\\|?*\x00-\x1F]')
-WHITESPACE_PATTERN = re.compile(r"\s+")
+try:
+    import orjson
+
+    _loads = orjson.loads
+    _dumps = orjson.dumps
+
+except ImportError:
+    _loads = json.loads
+
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+# re.ASCII turns \d and \s into single-byte range checks instead of
+# Unicode category lookups; filenames here are ASCII-dominant.
+DATE_PATTERN = re.compile(r"^(?P<date>\d{4}\.\d{2}\.\d{2})\s*-\s*(?P<rest>.+)$", re.ASCII)
+WHITESPACE_PATTERN = re.compile(r"\s+", re.ASCII)
+
+_WS_SUB = WHITESPACE_PATTERN.sub
+
+# Characters stripped from filename components: C0 controls plus the
+# set Windows forbids in names. A translate table deletes them in one
+# C-level pass, without the regex engine.
+_BAD_TABLE = str.maketrans(dict.fromkeys(list(range(0x20)) + [ord(c) for c in '<>:"/\\|?*']))
 
 
 @dataclass
@@ -24,7 +50,7 @@ class Config:
     file_extensions: List[str]
     company_aliases: Dict[str, str]
     medical_people: Dict[str, str]
-    medical_companies: List[str]
+    medical_companies: FrozenSet[str]
     move_files: bool
 
 
@@ -36,30 +62,39 @@ class PlannedAction:
     reason: str
 
 
+@functools.lru_cache(maxsize=4096)
 def normalize_key(value: str) -> str:
-    return WHITESPACE_PATTERN.sub(" ", value.strip().lower())
+    # str.split() with no argument already trims and collapses runs of
+    # whitespace, all in C and for any whitespace kind.
+    return " ".join(value.lower().split())
 
 
 def sanitize_filename_component(value: str) -> str:
-    value = SAFE_CHARS_PATTERN.sub("", value)
-    value = WHITESPACE_PATTERN.sub(" ", value).strip()
-    return value
+    value = value.translate(_BAD_TABLE)
+    return _WS_SUB(" ", value).strip()
 
 
 def parse_config(path: Path) -> Config:
-    data = json.loads(path.read_text(encoding="utf-8"))
+    data = _loads(path.read_bytes())
 
     source_dir = Path(data["source_dir"]).expanduser()
     destination_root = Path(data["destination_root"]).expanduser()
     review_dir = Path(data.get("review_dir", str(destination_root / "_Needs Review"))).expanduser()
 
     extensions = [ext.lower() for ext in data.get("file_extensions", [".pdf"])]
-    aliases_raw = data.get("company_aliases", {})
-    company_aliases = {normalize_key(k): v.strip() for k, v in aliases_raw.items() if v.strip()}
-
-    people_raw = data.get("medical_people", {})
-    medical_people = {normalize_key(k): v.strip() for k, v in people_raw.items() if v.strip()}
-    medical_companies = [normalize_key(c) for c in data.get("medical_companies", [])]
+    _nk = normalize_key
+    company_aliases = {}
+    for k, v in data.get("company_aliases", {}).items():
+        v = v.strip()
+        if v:
+            company_aliases[_nk(k)] = v
+
+    medical_people = {}
+    for k, v in data.get("medical_people", {}).items():
+        v = v.strip()
+        if v:
+            medical_people[_nk(k)] = v
+    medical_companies = frozenset(normalize_key(c) for c in data.get("medical_companies", []))
 
     move_files = bool(data.get("move_files", True))
 
@@ -75,45 +110,119 @@ def parse_config(path: Path) -> Config:
     )
 
 
-def load_index(index_path: Path) -> Dict[str, List[str]]:
+def load_index(index_path: Path) -> Tuple[Dict[str, List[str]], bool]:
+    # The index is newline-delimited JSON, one {"h": hash, "p": path}
+    # record per line, appended to across runs. Returns the in-memory
+    # index plus a flag saying the file should be compacted (it is in
+    # the legacy whole-document format, or stale/duplicate records have
+    # accumulated past twice the live entry count).
     if not index_path.exists():
-        return {}
-    try:
-        data = json.loads(index_path.read_text(encoding="utf-8"))
-        if isinstance(data, dict):
-            clean = {}
-            for k, v in data.items():
-                if isinstance(k, str) and isinstance(v, list):
-                    clean[k] = [str(item) for item in v]
-            return clean
-    except json.JSONDecodeError:
-        pass
-    return {}
+        return {}, False
+    raw = index_path.read_bytes()
+    if not raw.strip():
+        return {}, False
+
+    index: Dict[str, List[str]] = {}
+    records = 0
+    corrupt = False
+    for line in raw.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            entry = _loads(line)
+        except ValueError:
+            entry = None
+        if isinstance(entry, dict) and "h" in entry and "p" in entry:
+            records += 1
+            paths = index.setdefault(str(entry["h"]), [])
+            path = str(entry["p"])
+            if path not in paths:
+                paths.append(path)
+        elif records == 0:
+            # First non-empty line is not a record: whole-document format
+            # written before the switch to JSONL.
+            try:
+                data = _loads(raw)
+                if isinstance(data, dict):
+                    for k, v in data.items():
+                        if isinstance(k, str) and isinstance(v, list):
+                            index[k] = [str(item) for item in v]
+            except ValueError:
+                pass
+            return index, True
+        else:
+            # Bad line after valid records is the usual leftover of an
+            # interrupted append; drop it and rewrite the file on save.
+            corrupt = True
+
+    live = sum(len(paths) for paths in index.values())
+    return index, corrupt or records > 2 * live
 
 
 def save_index(index_path: Path, index_data: Dict[str, List[str]]) -> None:
     index_path.parent.mkdir(parents=True, exist_ok=True)
-    index_path.write_text(json.dumps(index_data, indent=2, sort_keys=True), encoding="utf-8")
+    with index_path.open("wb") as f:
+        for h, paths in index_data.items():
+            for p in paths:
+                f.write(_dumps({"h": h, "p": p}) + b"\n")
 
 
-def hash_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
-    h = hashlib.sha256()
-    with path.open("rb") as f:
-        while True:
-            chunk = f.read(chunk_size)
-            if not chunk:
-                break
-            h.update(chunk)
-    return h.hexdigest()
+def append_index(index_path: Path, new_entries: List[Dict[str, str]]) -> None:
+    if not new_entries:
+        return
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    with index_path.open("ab") as f:
+        for entry in new_entries:
+            f.write(_dumps(entry) + b"\n")
 
 
-def split_filename_parts(name_without_ext: str) -> Tuple[Optional[str], List[str]]:
-    match = DATE_PATTERN.match(name_without_ext)
-    if not match:
-        return None, []
+if hasattr(hashlib, "file_digest"):
+
+    def hash_file(path: Path) -> str:
+        with path.open("rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+
+else:
 
-    date_str = match.group("date")
-    rest = match.group("rest")
+    def hash_file(path: Path) -> str:
+        h = hashlib.sha256()
+        with path.open("rb") as f:
+            try:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                # Empty files and exotic filesystems cannot be mapped.
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(chunk)
+            else:
+                with mm:
+                    h.update(mm)
+        return h.hexdigest()
+
+
+def split_filename_parts(name_without_ext: str) -> Tuple[Optional[str], List[str]]:
+    name = name_without_ext
+    # Well-formed names ("YYYY.MM.DD - rest") are the common case; a few
+    # slice checks beat dispatching into the regex engine. Oddly spaced
+    # names still fall through to DATE_PATTERN.
+    if (
+        len(name) >= 14
+        and name[4] == "."
+        and name[7] == "."
+        and name[10:13] == " - "
+        and name[:10].isascii()
+        and name[:4].isdigit()
+        and name[5:7].isdigit()
+        and name[8:10].isdigit()
+    ):
+        date_str = name[:10]
+        rest = name[13:]
+    else:
+        match = DATE_PATTERN.match(name)
+        if not match:
+            return None, []
+        date_str = match.group("date")
+        rest = match.group("rest")
     parts = [part.strip() for part in rest.split(" - ") if part.strip()]
     if not parts:
         return None, []
@@ -124,32 +233,46 @@ def canonical_company(company_raw: str, aliases: Dict[str, str]) -> str:
     return aliases.get(normalize_key(company_raw), company_raw.strip())
 
 
-def extract_person(parts: List[str], medical_people: Dict[str, str]) -> Optional[str]:
-    for part in parts:
-        person = medical_people.get(normalize_key(part))
+def extract_person(normalized_parts: List[str], medical_people: Dict[str, str]) -> Optional[str]:
+    for key in normalized_parts:
+        person = medical_people.get(key)
         if person:
             return person
     return None
 
 
-def is_medical(company: str, person: Optional[str], medical_companies: List[str]) -> bool:
+def is_medical(company_key: str, person: Optional[str], medical_companies: FrozenSet[str]) -> bool:
     if person:
         return True
-    return normalize_key(company) in medical_companies
+    return company_key in medical_companies
 
 
-def ensure_unique_path(path: Path) -> Path:
-    if not path.exists():
+def ensure_unique_path(path: Path, siblings_cache: Dict[Path, set]) -> Path:
+    # One listdir per target directory (cached across calls) replaces a
+    # stat per candidate name; names we hand out are added to the cached
+    # set so collisions within the same run are resolved too.
+    parent = path.parent
+    siblings = siblings_cache.get(parent)
+    if siblings is None:
+        try:
+            siblings = set(os.listdir(parent))
+        except OSError:
+            siblings = set()
+        siblings_cache[parent] = siblings
+
+    name = path.name
+    if name not in siblings:
+        siblings.add(name)
         return path
+
     stem = path.stem
     suffix = path.suffix
-    parent = path.parent
     counter = 2
-    while True:
-        candidate = parent / f"{stem} ({counter}){suffix}"
-        if not candidate.exists():
-            return candidate
+    while f"{stem} ({counter}){suffix}" in siblings:
         counter += 1
+    candidate = f"{stem} ({counter}){suffix}"
+    siblings.add(candidate)
+    return parent / candidate
 
 
 def build_destination(
@@ -167,8 +290,11 @@ def build_destination(
             reason="missing or invalid date prefix (expected YYYY.MM.DD - ...)",
         )
 
+    # DATE_PATTERN already guarantees the YYYY.MM.DD shape; the datetime
+    # constructor validates the calendar values far cheaper than strptime,
+    # which re-interprets the format string on every call.
     try:
-        dt = datetime.strptime(date_str, "%Y.%m.%d")
+        datetime(int(date_str[:4]), int(date_str[5:7]), int(date_str[8:10]))
     except ValueError:
         return PlannedAction(
             source=file_path,
@@ -177,7 +303,7 @@ def build_destination(
             reason="invalid date prefix",
         )
 
-    year = dt.strftime("%Y")
+    year = date_str[:4]
     company_raw = parts[0]
     company = sanitize_filename_component(canonical_company(company_raw, cfg.company_aliases))
     if not company:
@@ -188,14 +314,22 @@ def build_destination(
             reason="company name is empty after normalization",
         )
 
-    trailing_parts = [sanitize_filename_component(p) for p in parts[1:] if sanitize_filename_component(p)]
-    person = extract_person(trailing_parts, cfg.medical_people)
-    medical = is_medical(company, person, cfg.medical_companies)
+    trailing_parts = []
+    normalized = []
+    for p in parts[1:]:
+        s = sanitize_filename_component(p)
+        if s:
+            trailing_parts.append(s)
+            normalized.append(normalize_key(s))
+    person = extract_person(normalized, cfg.medical_people)
+    medical = is_medical(normalize_key(company), person, cfg.medical_companies)
 
-    description_parts = trailing_parts[:]
     if person:
-        description_parts = [p for p in description_parts if normalize_key(p) != normalize_key(person)]
-    description = " - ".join(description_parts)
+        person_key = normalize_key(person)
+        description_parts = [p for p, nk in zip(trailing_parts, normalized) if nk != person_key]
+    else:
+        description_parts = trailing_parts
+    description = " - ".join(description_parts) if description_parts else ""
 
     if medical and not person:
         return PlannedAction(
@@ -226,21 +360,34 @@ def build_destination(
     )
 
 
-def list_candidate_files(cfg: Config) -> List[Path]:
-    files = []
-    for item in cfg.source_dir.iterdir():
-        if not item.is_file():
-            continue
-        if item.suffix.lower() in cfg.file_extensions:
-            files.append(item)
-    return sorted(files)
+def list_candidate_files(cfg: Config) -> Iterator[Path]:
+    # Sorted output needs the names up front, but only the path strings
+    # are materialized; Path objects are built lazily as the consumer
+    # pulls them, so planning and hashing start before all of them exist.
+    exts = frozenset(cfg.file_extensions)
+    with os.scandir(cfg.source_dir) as it:
+        entry_paths = sorted(
+            entry.path
+            for entry in it
+            if entry.is_file(follow_symlinks=False)
+            and os.path.splitext(entry.name)[1].lower() in exts
+        )
+    for entry_path in entry_paths:
+        yield Path(entry_path)
 
 
 class TeeLogger:
+    # Log lines are batched and written to the file every _FLUSH_EVERY
+    # messages (and on exit) so a long run costs a handful of write
+    # syscalls instead of one per action. stdout still gets every line
+    # immediately.
+    _FLUSH_EVERY = 256
+
     def __init__(self, log_path: Path, fallback_dir: Optional[Path] = None) -> None:
         self.log_path = log_path
         self.fallback_dir = fallback_dir
         self._fh = None
+        self._buffer: List[str] = []
 
     def __enter__(self) -> "TeeLogger":
         try:
@@ -260,21 +407,29 @@ class TeeLogger:
 
     def __exit__(self, exc_type, exc, tb) -> None:
         if self._fh:
+            self._drain()
             self._fh.close()
             self._fh = None
 
+    def _drain(self) -> None:
+        if self._buffer:
+            self._fh.write("\n".join(self._buffer) + "\n")
+            self._buffer.clear()
+
     def line(self, message: str) -> None:
         print(message)
         if self._fh:
-            self._fh.write(message + "\n")
-            self._fh.flush()
+            self._buffer.append(message)
+            if len(self._buffer) >= self._FLUSH_EVERY:
+                self._drain()
 
 
 def process_files(cfg: Config, dry_run: bool) -> int:
     cfg.destination_root.mkdir(parents=True, exist_ok=True)
     cfg.review_dir.mkdir(parents=True, exist_ok=True)
-    log_year = datetime.now().strftime("%Y")
-    log_path = cfg.destination_root / log_year / f"filestash_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+    now = datetime.now()
+    log_year = now.strftime("%Y")
+    log_path = cfg.destination_root / log_year / f"filestash_{now.strftime('%Y%m%d_%H%M%S')}.log"
     fallback_dir = Path.cwd()
 
     with TeeLogger(log_path, fallback_dir=fallback_dir) as logger:
@@ -289,76 +444,113 @@ def process_files(cfg: Config, dry_run: bool) -> int:
             return 2
 
         index_path = cfg.destination_root / ".filing_hash_index.json"
-        index = load_index(index_path)
-
-        files = list_candidate_files(cfg)
-        if not files:
-            logger.line("No candidate files found.")
-            logger.line(f"Log file: {log_path}")
-            return 0
-
-        planned = [build_destination(path, cfg) for path in files]
+        index, compact_needed = load_index(index_path)
+        new_entries: List[Dict[str, str]] = []
+        # Resolve which indexed paths still exist once up front; the
+        # duplicate check then becomes a set probe instead of a stat per
+        # recorded path per candidate.
+        known_existing = {p for paths in index.values() for p in paths if Path(p).exists()}
+
+        # When source and destination share a filesystem, a move is a
+        # single rename syscall; shutil.move re-discovers this per file.
+        try:
+            same_device = os.stat(cfg.source_dir).st_dev == os.stat(cfg.destination_root).st_dev
+        except OSError:
+            same_device = False
 
         moved = 0
         reviewed = 0
         duplicates = 0
         errors = 0
-
-        for action in planned:
-            source = action.source
-            destination = action.destination
-            if destination is None:
-                logger.line(f"SKIP  {source.name}: no destination")
-                continue
-
-            try:
-                source_hash = hash_file(source)
-            except OSError as exc:
-                logger.line(f"ERROR {source.name}: failed to hash source ({exc})")
-                errors += 1
-                continue
-
-            known_paths = index.get(source_hash, [])
-            if any(Path(p).exists() for p in known_paths):
-                logger.line(f"DUP   {source.name}: identical file already indexed")
-                duplicates += 1
-                continue
-
-            if action.status == "review":
-                target = ensure_unique_path(destination)
-                logger.line(f"REVIEW {source.name} -> {target} ({action.reason})")
-                reviewed += 1
-            else:
-                target = ensure_unique_path(destination)
-                logger.line(f"MOVE  {source.name} -> {target}")
-                moved += 1
-
-            if dry_run:
-                continue
-
-            target.parent.mkdir(parents=True, exist_ok=True)
-            try:
-                if cfg.move_files:
-                    shutil.move(str(source), str(target))
+        siblings_cache: Dict[Path, set] = {}
+
+        # Hashing releases the GIL inside hashlib, so threads overlap
+        # disk reads and digest work across files; submitting while the
+        # candidate scan is still being consumed starts that work early.
+        with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+            planned = []
+            hash_futures = {}
+            for path in list_candidate_files(cfg):
+                action = build_destination(path, cfg)
+                planned.append(action)
+                if action.destination is not None:
+                    hash_futures[action.source] = executor.submit(hash_file, action.source)
+
+            if not planned:
+                logger.line("No candidate files found.")
+                logger.line(f"Log file: {log_path}")
+                return 0
+
+            for action in planned:
+                source = action.source
+                destination = action.destination
+                if destination is None:
+                    logger.line(f"SKIP  {source.name}: no destination")
+                    continue
+
+                try:
+                    source_hash = hash_futures[source].result()
+                except OSError as exc:
+                    logger.line(f"ERROR {source.name}: failed to hash source ({exc})")
+                    errors += 1
+                    continue
+
+                known_paths = index.get(source_hash, [])
+                if any(p in known_existing for p in known_paths):
+                    logger.line(f"DUP   {source.name}: identical file already indexed")
+                    duplicates += 1
+                    continue
+
+                if action.status == "review":
+                    target = ensure_unique_path(destination, siblings_cache)
+                    logger.line(f"REVIEW {source.name} -> {target} ({action.reason})")
+                    reviewed += 1
                 else:
-                    shutil.copy2(str(source), str(target))
-            except OSError as exc:
-                logger.line(f"ERROR {source.name}: move/copy failed ({exc})")
-                errors += 1
-                continue
-
-            target_hash = source_hash
-            target_key = str(target)
-            existing = index.setdefault(target_hash, [])
-            if target_key not in existing:
-                existing.append(target_key)
+                    target = ensure_unique_path(destination, siblings_cache)
+                    logger.line(f"MOVE  {source.name} -> {target}")
+                    moved += 1
+
+                if dry_run:
+                    continue
+
+                target.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    if cfg.move_files:
+                        if same_device:
+                            try:
+                                os.replace(source, target)
+                            except OSError as exc:
+                                # review_dir may sit on another filesystem
+                                # even when source and destination share one.
+                                if exc.errno != errno.EXDEV:
+                                    raise
+                                shutil.move(source, target)
+                        else:
+                            shutil.move(source, target)
+                    else:
+                        shutil.copy2(source, target)
+                except OSError as exc:
+                    logger.line(f"ERROR {source.name}: move/copy failed ({exc})")
+                    errors += 1
+                    continue
+
+                target_hash = source_hash
+                target_key = str(target)
+                existing = index.setdefault(target_hash, [])
+                if target_key not in existing:
+                    existing.append(target_key)
+                    new_entries.append({"h": target_hash, "p": target_key})
+                known_existing.add(target_key)
 
         if not dry_run:
-            save_index(index_path, index)
+            if compact_needed:
+                save_index(index_path, index)
+            else:
+                append_index(index_path, new_entries)
 
         logger.line("")
         logger.line("Summary")
-        logger.line(f"  Candidates: {len(files)}")
+        logger.line(f"  Candidates: {len(planned)}")
         logger.line(f"  Moved:      {moved}")
         logger.line(f"  To review:  {reviewed}")
         logger.line(f"  Duplicates: {duplicates}")
@@ -397,7 +589,7 @@ def main() -> int:
 
     try:
         cfg = parse_config(config_path)
-    except (json.JSONDecodeError, KeyError) as exc:
+    except (ValueError, KeyError) as exc:
         print(f"ERROR: invalid config ({exc})")
         return 2
 